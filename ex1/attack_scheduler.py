@@ -0,0 +1,106 @@
+import timing_attack
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+class ProgressObserver:
+    """Puts the progress of an AttackEngine on a queue as dicts, one per round and one when it finishes."""
+    def __init__(self, target, events):
+        self.target = target
+        self.events = events
+
+    def send(self, event, **fields):
+        self.events.put(dict({"target": self.target, "event": event, "time": time.time()}, **fields))
+
+    def start(self, engine):
+        self.send("start", bits=engine.N.bit_length())
+
+    def round_start(self, engine):
+        pass
+
+    def round_end(self, engine, outcome):
+        self.send("round", outcome=outcome, prefix_bits=engine.d.bit_length(), queries=engine.queries,
+                  backtracks=engine.backtracks)
+
+    def finish(self, engine, result):
+        pass
+
+def attack_target(target, N, d, samples, max_backtracks, decision, seed, events):
+    """Recover the key of one target in a worker process, returns its result as a dict."""
+    random.seed(seed)
+    oracle = partial(timing_attack.decryption_oracle, N=N, d=d)
+    # candidate classification and the batched oracle both run here, in the worker of this target
+    measure = lambda cs: timing_attack.decryption_oracle_batch(cs, N, d)[2].tolist()
+    engine = timing_attack.AttackEngine(oracle, N, samples, max_backtracks, measure=measure,
+                                        observer=ProgressObserver(target, events), decision=decision)
+    result = engine.run()
+    return {"target": target, "event": "finish", "time": time.time(), "cracked": result.cracked,
+            "correct": result.d == d, "queries": result.queries, "backtracks": result.backtracks,
+            "seconds": result.seconds}
+
+def load_targets(path):
+    """Targets of a JSON lines file, one {"name", "N", "d"} object per line."""
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row.get("name", str(i)), int(row["N"]), int(row["d"])) for i, row in enumerate(rows)]
+
+def gen_targets(count, bits, rng):
+    targets = []
+    for i in range(count):
+        random.seed(rng.getrandbits(64))
+        N, e, d, p, q = timing_attack.key_gen(bits)
+        targets.append(("key%d" % i, N, d))
+    return targets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the timing attack on many keys at once, progress as JSON lines.")
+    parser.add_argument("--targets", help="JSON lines file of {name, N, d} targets, instead of generated keys")
+    parser.add_argument("--keys", type=int, default=16, help="keys generated when there is no target file")
+    parser.add_argument("--bits", type=int, default=timing_attack.n_bits, help="modulus size of the generated keys")
+    parser.add_argument("--samples", type=int, default=timing_attack.num_samples, help="ciphertexts per set")
+    parser.add_argument("--backtracks", type=int, default=timing_attack.max_bactracks, help="maximum amount of backtracks")
+    parser.add_argument("--decision", choices=("fixed", "sprt"), default=timing_attack.decision, help="how a bit is decided")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="targets attacked in parallel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="JSON lines output file, stdout if not given")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    targets = load_targets(args.targets) if args.targets else gen_targets(args.keys, args.bits, rng)
+    out = open(args.out, "w") if args.out else sys.stdout
+
+    def emit(event):
+        out.write(json.dumps(event) + "\n")
+        out.flush()
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(args.workers) as executor:
+        # workers report their rounds through the queue while the results come back through the futures
+        events = manager.Queue()
+        pending = {executor.submit(attack_target, name, N, d, args.samples, args.backtracks, args.decision,
+                                   rng.getrandbits(64), events) for name, N, d in targets}
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    emit(events.get_nowait())
+                except queue.Empty:
+                    break
+            for future in done:
+                results.append(future.result())
+                emit(results[-1])
+
+    seconds = time.perf_counter() - start
+    cracked = sum(r["correct"] for r in results)
+    emit({"event": "summary", "targets": len(results), "cracked": cracked, "seconds": seconds,
+          "queries": sum(r["queries"] for r in results), "keys_per_hour": cracked * 3600 / seconds})
+    if out is not sys.stdout:
+        out.close()
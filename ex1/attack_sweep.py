@@ -0,0 +1,89 @@
+import timing_attack
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
+import numpy as np
+
+# the blinded oracle lives in ex3
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex3"))
+
+# decryption oracle of ex3, decrypts with a fresh blinding factor every time
+def blinded_oracle(enc_x, N, d, e):
+    import rsa_blinded
+    x, h, r = rsa_blinded.dec(enc_x, N, d, e)
+    return x, 0, r
+
+def run_trial(oracle_name, bits, samples, equal, larger, decision, max_backtracks, seed):
+    """Attack one fresh key, returns the AttackResult with the key length."""
+    random.seed(seed)
+    N, e, d, p, q = timing_attack.key_gen(bits)
+    if oracle_name == "blinded":
+        oracle = partial(blinded_oracle, N=N, d=d, e=e)
+        measure = None
+    else:
+        oracle = partial(timing_attack.decryption_oracle, N=N, d=d)
+        measure = lambda cs: timing_attack.decryption_oracle_batch(cs, N, d)[2].tolist()
+    engine = timing_attack.AttackEngine(oracle, N, samples, max_backtracks, equal, larger, measure=measure, decision=decision)
+    result = engine.run()
+    return result, result.d == d, d.bit_length()
+
+def summarize(config, trials):
+    results = [t[0] for t in trials]
+    cracked = [t for t in trials if t[1]]
+    recovered_bits = sum(t[2] for t in cracked)
+    row = dict(config)
+    row["keys"] = len(trials)
+    row["success_rate"] = len(cracked) / len(trials)
+    row["median_queries"] = float(np.median([r.queries for r in results]))
+    row["median_backtracks"] = float(np.median([r.backtracks for r in results]))
+    # all the time spent, also on failed keys, per bit of the keys that were recovered
+    row["seconds_per_bit"] = sum(r.seconds for r in results) / recovered_bits if recovered_bits else None
+    return row
+
+def write_table(rows, path):
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Success rate and cost of the timing attack over a grid of parameters.")
+    parser.add_argument("--oracle", nargs="+", choices=("naive", "blinded"), default=["naive", "blinded"])
+    parser.add_argument("--bits", nargs="+", type=int, default=[16, 20, 24], help="modulus sizes")
+    parser.add_argument("--samples", nargs="+", type=int, default=[8, 16, 32, 64], help="ciphertexts per set")
+    parser.add_argument("--equal", nargs="+", type=float, default=[0.3], help="fuzzy_equal thresholds")
+    parser.add_argument("--larger", nargs="+", type=float, default=[0.5], help="significantly_larger thresholds")
+    parser.add_argument("--decision", nargs="+", choices=("fixed", "sprt"), default=["fixed"], help="bit decision modes")
+    parser.add_argument("--backtracks", type=int, default=timing_attack.max_bactracks, help="maximum amount of backtracks")
+    parser.add_argument("--keys", type=int, default=20, help="keys attacked per configuration")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="keys attacked in parallel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="sweep.csv", help="output table, .csv or .json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    with ProcessPoolExecutor(args.workers) as executor:
+        grid = product(args.oracle, args.bits, args.samples, args.equal, args.larger, args.decision)
+        for oracle_name, bits, samples, equal, larger, decision in grid:
+            config = {"oracle": oracle_name, "bits": bits, "samples": samples, "equal": equal, "larger": larger,
+                      "decision": decision}
+            seeds = [rng.getrandbits(64) for _ in range(args.keys)]
+            params = [(oracle_name, bits, samples, equal, larger, decision, args.backtracks, s) for s in seeds]
+            trials = list(executor.map(run_trial, *zip(*params)))
+            row = summarize(config, trials)
+            rows.append(row)
+            print(", ".join("%s=%s" % (k, round(v, 4) if isinstance(v, float) else v) for k, v in row.items()))
+
+    write_table(rows, args.out)
+    print("Results written to %s" % args.out)
@@ -0,0 +1,45 @@
+import bigint
+import naive_rsa
+import time
+from random import randrange, seed
+
+#modulus sizes to benchmark
+sizes = (1024, 2048, 4096)
+#calls timed per operation and size
+reps = 5
+
+def time_op(op, args):
+    start = time.perf_counter()
+    for a in args:
+        op(*a)
+    return (time.perf_counter() - start) / len(args)
+
+def operations(bits):
+    # N = p * q keeps random values invertible, d doesn't have to match a public exponent
+    p, q = [bigint.next_prime(randrange(2 ** (bits // 2 - 1), 2 ** (bits // 2))) for _ in range(2)]
+    N = p * q
+    d = randrange(2 ** (bits - 2), (p - 1) * (q - 1))
+    crt = naive_rsa.crt_params(p, q, d)
+    xs = [randrange(2, N) for _ in range(reps)]
+    return [
+        ("powmod", bigint.powmod, [(x, d, N) for x in xs]),
+        ("invert", bigint.invert, [(x, N) for x in xs]),
+        ("is_prime", bigint.is_prime, [(x,) for x in xs]),
+        ("next_prime", bigint.next_prime, [(x >> (bits // 2),) for x in xs]),
+        ("fast_pow", naive_rsa.fast_pow, [(x, N, d) for x in xs]),
+        ("dec_crt", naive_rsa.dec_crt, [(x, crt) for x in xs]),
+    ]
+
+if __name__ == "__main__":
+    if bigint.gmpy2 is None:
+        raise SystemExit("gmpy2 isn't installed, there is nothing to compare the python backend with")
+    seed(0)
+    gmpy2 = bigint.gmpy2
+    print("%6s %12s %12s %12s %10s" % ("bits", "operation", "python ms", "gmpy2 ms", "speedup"))
+    for bits in sizes:
+        for name, op, args in operations(bits):
+            bigint.gmpy2 = None
+            slow = time_op(op, args)
+            bigint.gmpy2 = gmpy2
+            fast = time_op(op, args)
+            print("%6d %12s %12.3f %12.3f %9.2fx" % (bits, name, slow * 1000, fast * 1000, slow / fast))
@@ -0,0 +1,47 @@
+import os
+import re
+import subprocess
+import sys
+
+# entry modules, by exercise directory, whose import time is checked
+entries = {
+    "ex1": ("naive_rsa", "timing_attack", "oracle_pool", "primegen", "trace_file"),
+    "ex2": ("blind_signature",),
+    "ex3": ("rsa_blinded", "timing_attack_blind"),
+}
+# modules an entry must not load on import, they belong to the code paths that use them
+heavy = ("numpy", "blessed", "sympy", "concurrent.futures")
+# entries allowed to load a heavy module on import
+allowed = {"trace_file": ("numpy",)}
+# cumulative import time budget per entry
+budget_ms = 150
+# imports timed per entry, the fastest counts
+runs = 3
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def import_time(directory, module):
+    """(cumulative import time in ms, every module loaded) of importing module in a fresh interpreter."""
+    best = None
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                             cwd=os.path.join(root, directory), capture_output=True, text=True, check=True).stderr
+        # import time: self [us] | cumulative | imported package
+        rows = re.findall(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", out)
+        total = sum(int(us) for us, indent, name in rows if not indent)
+        if best is None or total < best:
+            best = total
+        loaded = {name for _, _, name in rows}
+    return best / 1000, loaded
+
+if __name__ == "__main__":
+    failed = False
+    print("%5s %20s %10s  %s" % ("dir", "module", "ms", "heavy modules"))
+    for directory, modules in entries.items():
+        for module in modules:
+            ms, loaded = import_time(directory, module)
+            found = [h for h in heavy if h in loaded and h not in allowed.get(module, ())]
+            ok = ms <= budget_ms and not found
+            failed = failed or not ok
+            print("%5s %20s %10.1f  %s%s" % (directory, module, ms, ", ".join(found) or "-", "" if ok else "  FAIL"))
+    sys.exit(1 if failed else 0)
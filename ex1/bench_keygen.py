@@ -0,0 +1,42 @@
+import naive_rsa
+import primegen
+import os
+import tempfile
+import time
+
+#modulus sizes to benchmark
+sizes = (1024, 2048, 4096)
+#keys generated per size and method
+keys = 4
+#worker processes of the parallel prime generator
+workers = os.cpu_count()
+
+def w_for(bits):
+    # GenRSA draws primes of len(w) // 2 + 1 bits
+    return "1" * (bits - 2)
+
+def keys_per_second(gen, count):
+    start = time.perf_counter()
+    gen(count)
+    return count / (time.perf_counter() - start)
+
+def serial_keys(bits, count):
+    for _ in range(count):
+        naive_rsa.GenRSA(w_for(bits))
+
+def parallel_keys(bits, count):
+    # two primes per key, all of them generated at once over the worker processes
+    primegen.gen_primes(len(w_for(bits)) // 2 + 1, 2 * count, workers)
+
+if __name__ == "__main__":
+    print("%6s %22s %10s" % ("bits", "method", "keys/s"))
+    for bits in sizes:
+        print("%6d %22s %10.2f" % (bits, "GenRSA", keys_per_second(lambda n: serial_keys(bits, n), keys)))
+        print("%6d %22s %10.2f" % (bits, "primes, %d workers" % workers, keys_per_second(lambda n: parallel_keys(bits, n), keys)))
+
+        # GenRSA drawing from a pool filled up front, filling isn't timed
+        with tempfile.TemporaryDirectory() as path:
+            pool = primegen.PrimePool(path)
+            pool.fill(len(w_for(bits)) // 2 + 1, 2 * keys, workers)
+            rate = keys_per_second(lambda n: [naive_rsa.GenRSA(w_for(bits), pool) for _ in range(n)], keys)
+            print("%6d %22s %10.2f" % (bits, "GenRSA from pool", rate))
@@ -0,0 +1,41 @@
+import naive_rsa
+import time
+from random import randrange, seed
+
+#modulus sizes to benchmark
+sizes = (512, 1024, 2048, 4096)
+#number of exponentiations timed per mode and size
+reps = 5
+#window width of the kary and sliding modes
+window = 4
+
+def random_modulus(bits):
+    # exponentiation cost doesn't depend on N being a product of primes, a random odd N is enough
+    return randrange(2 ** (bits - 1), 2 ** bits) | 1
+
+def time_mode(mode, arith, ciphers, N, d):
+    # checked once before the clock starts, the builtin pow would cost about as much as the mode itself
+    x, _, _ = naive_rsa.fast_pow(ciphers[0], N, d, mode, window, arith)
+    assert x == pow(ciphers[0], d, N), "%s mode gives a wrong result" % mode
+    start = time.perf_counter()
+    for c in ciphers:
+        naive_rsa.fast_pow(c, N, d, mode, window, arith)
+    return (time.perf_counter() - start) / len(ciphers)
+
+if __name__ == "__main__":
+    seed(0)
+    print("%6s %10s %12s %12s %10s" % ("bits", "mode", "arith", "ms/pow", "speedup"))
+    for bits in sizes:
+        N = random_modulus(bits)
+        d = randrange(2 ** (bits - 1), N)
+        ciphers = [randrange(2, N) for _ in range(reps)]
+
+        # the current square-and-multiply loop is the baseline
+        base = time_mode("binary", "plain", ciphers, N, d)
+        for arith in naive_rsa.ARITHS:
+            for mode in naive_rsa.POW_MODES:
+                # the ladder has its own arithmetic, shown once
+                if mode == "ladder" and arith != naive_rsa.ARITHS[0]:
+                    continue
+                t = base if (mode, arith) == ("binary", "plain") else time_mode(mode, arith, ciphers, N, d)
+                print("%6d %10s %12s %12.3f %9.2fx" % (bits, mode, arith if mode != "ladder" else "-", t * 1000, base / t))
@@ -0,0 +1,123 @@
+import naive_rsa
+import timing_attack
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# the blinded decryption lives in ex3
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex3"))
+
+#statistics compared between the fixed and the random ciphertexts, one column each
+STATS = ("reductions", "ns")
+#ciphertext of the fixed class, powers of a small one stay below N for the first steps and skip their reductions
+fixed_cipher = 2
+#|t| above which a statistic is considered to leak, the usual TVLA threshold
+threshold = 4.5
+
+class Welford:
+    """
+    Streaming mean and variance of every column of the samples, in constant memory.
+    A batch is reduced with numpy and merged into the running moments (Chan et al.).
+    """
+    def __init__(self, columns):
+        self.n = 0
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)
+
+    def add(self, samples):
+        n = len(samples)
+        if n == 0:
+            return
+        mean = samples.mean(axis=0)
+        m2 = ((samples - mean) ** 2).sum(axis=0)
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.n * n / total)
+        self.n = total
+
+    def variance(self):
+        return self.m2 / max(self.n - 1, 1)
+
+def welch_t(a, b):
+    """Welch's t-statistic of every column, +-inf for different constants, 0 for equal ones."""
+    diff = a.mean - b.mean
+    se = np.sqrt(a.variance() / max(a.n, 1) + b.variance() / max(b.n, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(se > 0, diff / se, np.where(diff == 0, 0.0, np.sign(diff) * np.inf))
+
+def target_dec(name, N, d, e, mode, arith, pool_size):
+    """dec(c) -> (x, h, reductions) of the implementation under test."""
+    if name == "naive":
+        return lambda c: naive_rsa.dec(c, N, d, mode, arith)
+    import rsa_blinded
+    pool = rsa_blinded.BlindingPool(N, e, pool_size) if pool_size else None
+    return lambda c: rsa_blinded.dec(c, N, d, e, mode, arith, pool)
+
+def measure(dec, cs):
+    """(len(cs), len(STATS)) array of the reductions and the ns timing of every decryption."""
+    clock = time.perf_counter_ns
+    rows = []
+    for c in cs:
+        start = clock()
+        x, h, r = dec(c)
+        rows.append((r, clock() - start))
+    return np.array(rows, dtype=np.float64)
+
+def assess(dec, N, queries, batch_size, rng, fixed_c=fixed_cipher, report=None):
+    """
+    Fixed-vs-random test of dec: every query decrypts either fixed_c or a fresh random ciphertext,
+    the class drawn at random so drift of the machine hits both alike.
+    Returns the (fixed, random) Welford accumulators, report(done, t) is called after every batch.
+    """
+    fixed, rand = Welford(len(STATS)), Welford(len(STATS))
+    mask_rng = np.random.default_rng(rng.getrandbits(64))
+    done = 0
+    while done < queries:
+        n = min(batch_size, queries - done)
+        is_fixed = mask_rng.random(n) < 0.5
+        cs = [fixed_c if f else rng.randrange(1, N) for f in is_fixed]
+        samples = measure(dec, cs)
+        fixed.add(samples[is_fixed])
+        rand.add(samples[~is_fixed])
+        done = done + n
+        if report is not None:
+            report(done, welch_t(fixed, rand))
+    return fixed, rand
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Welch t-test of a dec implementation over fixed-vs-random ciphertexts.")
+    parser.add_argument("--dec", choices=("naive", "blinded"), default="naive", help="naive_rsa.dec or rsa_blinded.dec")
+    parser.add_argument("--mode", choices=naive_rsa.POW_MODES, default="binary", help="exponentiation mode")
+    parser.add_argument("--arith", choices=naive_rsa.ARITHS, default="plain", help="modular arithmetic")
+    parser.add_argument("--pool", type=int, default=0, help="blinding pool size of rsa_blinded.dec, 0 for a fresh r every time")
+    parser.add_argument("--bits", type=int, default=64, help="modulus size of the generated key")
+    parser.add_argument("--queries", type=int, default=1000000, help="decryptions, both classes together")
+    parser.add_argument("--batch", type=int, default=10000, help="decryptions per accumulator update")
+    parser.add_argument("--fixed", type=int, default=fixed_cipher, help="ciphertext of the fixed class")
+    parser.add_argument("--threshold", type=float, default=threshold, help="|t| considered a leak")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(rng.getrandbits(64))
+    N, e, d, p, q = timing_attack.key_gen(args.bits)
+    dec = target_dec(args.dec, N, d, e, args.mode, args.arith, args.pool)
+
+    start = time.perf_counter()
+    def report(done, t):
+        print("%10d queries %8.1fs  " % (done, time.perf_counter() - start) +
+              "  ".join("t(%s)=%8.2f" % (name, v) for name, v in zip(STATS, t)), flush=True)
+
+    fixed, rand = assess(dec, N, args.queries, args.batch, rng, args.fixed % N, report)
+    t = welch_t(fixed, rand)
+    print()
+    print("%12s %14s %14s %10s" % ("statistic", "mean fixed", "mean random", "t"))
+    for i, name in enumerate(STATS):
+        verdict = "leaks" if abs(t[i]) > args.threshold else ""
+        print("%12s %14.2f %14.2f %10.2f  %s" % (name, fixed.mean[i], rand.mean[i], t[i], verdict))
+    # non-zero exit when a statistic leaks, for checking an implementation before it is deployed
+    sys.exit(1 if np.any(np.abs(t) > args.threshold) else 0)
@@ -0,0 +1,88 @@
+import math
+import random
+
+# oracle and key of a worker process, set once by init_worker instead of being sent with every task
+worker_oracle = None
+worker_key = ()
+
+def init_worker(oracle, key):
+    global worker_oracle, worker_key
+    worker_oracle = oracle
+    worker_key = key
+
+def measure_chunk(seed, ciphers):
+    """Query the oracle about a chunk of ciphertexts, returns (reductions, timings)."""
+    # oracles may draw randomness (blinding), a seed per chunk keeps runs reproducible
+    # no matter which worker picks the chunk up
+    random.seed(seed)
+    reductions = []
+    timings = []
+    for c in ciphers:
+        _, res_time, r = worker_oracle(c, *worker_key)
+        reductions.append(r)
+        timings.append(res_time)
+    return reductions, timings
+
+def measure_blocks(seeds, blocks):
+    """measure_chunk of every block with its own seed, the results concatenated."""
+    reductions = []
+    timings = []
+    for seed, block in zip(seeds, blocks):
+        r, t = measure_chunk(seed, block)
+        reductions.extend(r)
+        timings.extend(t)
+    return reductions, timings
+
+class OraclePool:
+    """
+    Measure ciphertexts with oracle(c, *key) -> (x, time, reductions) sharded over worker processes.
+    With a single worker everything runs in this process, the results are the same for a given seed.
+    Every block of block_size ciphertexts is seeded on its own, a batch is split into one chunk of
+    blocks per worker, so the seeds and the results don't depend on the number of workers.
+    """
+    def __init__(self, oracle, key, workers=1, seed=None, block_size=8):
+        self.oracle = oracle
+        self.key = tuple(key)
+        self.workers = workers
+        self.block_size = block_size
+        self.rng = random.Random(seed if seed is not None else random.getrandbits(64))
+        self.executor = None
+        if workers > 1:
+            # concurrent.futures is only loaded when there are worker processes
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(oracle, self.key))
+
+    def measure(self, ciphers):
+        """Return (reductions, timings) of ciphers, in order."""
+        ciphers = list(ciphers)
+        blocks = [ciphers[i:i + self.block_size] for i in range(0, len(ciphers), self.block_size)]
+        seeds = [self.rng.getrandbits(64) for _ in blocks]
+        if self.executor is None:
+            init_worker(self.oracle, self.key)
+            state = random.getstate()
+            results = [measure_blocks(seeds, blocks)]
+            random.setstate(state)
+        else:
+            # as many chunks as workers, a round's batch keeps them all busy
+            per_chunk = max(1, math.ceil(len(blocks) / self.workers))
+            starts = range(0, len(blocks), per_chunk)
+            results = self.executor.map(measure_blocks, [seeds[i:i + per_chunk] for i in starts],
+                                        [blocks[i:i + per_chunk] for i in starts])
+
+        reductions = []
+        timings = []
+        for r, t in results:
+            reductions.extend(r)
+            timings.extend(t)
+        return reductions, timings
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,158 @@
+import bigint
+import os
+import random
+try:
+    import fcntl
+except ImportError:
+    # no file locking on this platform, the prime pool is then only safe for one process at a time
+    fcntl = None
+
+def small_primes(limit):
+    """Primes below limit, sieve of Eratosthenes."""
+    sieve = bytearray(b"\x01") * limit
+    sieve[:2] = b"\x00\x00"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i, is_prime in enumerate(sieve) if is_prime]
+
+# odd primes used to sieve candidates before Miller-Rabin
+SIEVE_PRIMES = small_primes(2000)[1:]
+# candidates start + 2i sieved in one go
+SIEVE_WINDOW = 4096
+
+def mr_rounds(bits):
+    # rounds for random candidates of this size, after FIPS 186-4 appendix C.3
+    if bits >= 1536:
+        return 4
+    if bits >= 1024:
+        return 5
+    if bits >= 512:
+        return 8
+    return 40
+
+def miller_rabin(n, rounds, rng=random):
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def probable_prime(n, rounds, rng=random):
+    # GMP's Miller-Rabin when gmpy2 is installed, it picks its own bases instead of drawing them from rng
+    if bigint.gmpy2 is not None:
+        return bigint.is_prime(n, rounds)
+    return miller_rabin(n, rounds, rng)
+
+def is_prime(n, rng=random):
+    if n < 2:
+        return False
+    if n < 4:
+        return True
+    for p in [2] + SIEVE_PRIMES:
+        if n % p == 0:
+            return n == p
+    return probable_prime(n, mr_rounds(n.bit_length()), rng)
+
+def random_prime(bits, rng=random):
+    """Random prime of exactly bits bits (a prime between 2^(bits-1) and 2^bits)."""
+    if bits < 2:
+        raise ValueError("there are no primes of %s bits" % bits)
+    if bits <= SIEVE_PRIMES[-1].bit_length():
+        # candidates can be small primes themselves, the sieve would throw them away
+        while True:
+            n = rng.randrange(2 ** (bits - 1), 2 ** bits)
+            if is_prime(n, rng):
+                return n
+
+    rounds = mr_rounds(bits)
+    while True:
+        start = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        # window[i] stays set if start + 2i has no small factor
+        window = bytearray(b"\x01") * SIEVE_WINDOW
+        for p in SIEVE_PRIMES:
+            # start + 2i = 0 mod p  <=>  i = -start / 2 mod p
+            i = (-start * ((p + 1) // 2)) % p
+            window[i::p] = bytes(len(range(i, SIEVE_WINDOW, p)))
+        for i in range(SIEVE_WINDOW):
+            n = start + 2 * i
+            if n.bit_length() != bits:
+                break
+            if window[i] and probable_prime(n, rounds, rng):
+                return n
+
+def prime_task(bits, seed):
+    return random_prime(bits, random.Random(seed))
+
+def gen_primes(bits, count, workers=None, seed=None):
+    """Generate count primes of bits bits over a pool of worker processes, one seed per prime."""
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(count)]
+    if workers == 1:
+        return [prime_task(bits, s) for s in seeds]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(prime_task, [bits] * count, seeds))
+
+class PrimePool:
+    """
+    Pre-generated primes on disk, one file of hex lines per bit length.
+    take() removes the primes it returns, so a prime never ends up in two keys.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, bits):
+        return os.path.join(self.path, "primes_%d.txt" % bits)
+
+    def locked(self, bits):
+        lock = open(self.file(bits) + ".lock", "w")
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def read(self, bits):
+        try:
+            with open(self.file(bits)) as f:
+                return [int(line, 16) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def size(self, bits):
+        return len(self.read(bits))
+
+    def fill(self, bits, count, workers=None, seed=None):
+        """Generate count more primes of bits bits and append them to the pool."""
+        primes = gen_primes(bits, count, workers, seed)
+        with self.locked(bits):
+            with open(self.file(bits), "a") as f:
+                f.writelines("%x\n" % p for p in primes)
+
+    def take(self, bits, count=1):
+        """Remove count primes from the pool, the missing ones are generated if it runs dry."""
+        with self.locked(bits):
+            primes = self.read(bits)
+            keep = max(len(primes) - count, 0)
+            taken, primes = primes[keep:], primes[:keep]
+            tmp = self.file(bits) + ".tmp"
+            with open(tmp, "w") as f:
+                f.writelines("%x\n" % p for p in primes)
+            os.replace(tmp, self.file(bits))
+        return taken + [random_prime(bits) for _ in range(count - len(taken))]
+
+def default_pool():
+    """The pool named by the PRIME_POOL environment variable, if any."""
+    path = os.environ.get("PRIME_POOL")
+    return PrimePool(path) if path else None
@@ -1,9 +1,15 @@
 import naive_rsa
 import time
 import sys
+import random
+import argparse
+import json
+import os
+import math
+from itertools import islice
+from dataclasses import dataclass, field
+from functools import partial
 from random import randrange
-import numpy as np
-import blessed
 
 #number of bits the modulus
 n_bits = 20
@@ -11,6 +17,18 @@ n_bits = 20
 num_samples = 32
 #maximum amount of backtracks
 max_bactracks = 10
+#modular arithmetic of the attacked decryption, "plain" or "montgomery"
+arith = "plain"
+#number of ciphertexts eve samples up front and keeps reusing
+pool_size = 1024
+#number of worker processes measuring oracle queries, 1 measures in this process
+workers = 1
+#seed of the attack's randomness, None for a different run every time
+seed = None
+#how a bit is decided, "fixed" sets of num_samples or a "sprt" sequential test over growing sets
+decision = "fixed"
+#floor of the per-ciphertext variance assumed by the sprt decision, the most a single reduction (a Bernoulli draw) varies
+bernoulli_variance = 0.25
 
 # key gen function
 def key_gen(n_bits):
@@ -18,57 +36,264 @@ def key_gen(n_bits):
     return (N, e, d, p, q)
 
 # decryptioon oracle for Eve
-def decryption_oracle(enc_x, N, d):
-    start = time.time()
+# with a crt key (naive_rsa.crt_params) r is the pair of reductions mod p and mod q
+def decryption_oracle(enc_x, N, d, crt=None, arith="plain"):
+    start = time.perf_counter_ns()
     #encrypt the message
-    x, h, r = naive_rsa.dec(enc_x, N, d)
-    res_time = time.time() - start
-    #eve eavesdrops the protocol, so she knows those
+    if crt is not None:
+        x, h, r = naive_rsa.dec_crt(enc_x, crt)
+    else:
+        x, h, r = naive_rsa.dec(enc_x, N, d, arith=arith)
+    res_time = time.perf_counter_ns() - start
+    #eve eavesdrops the protocol, so she knows those, res_time in nanoseconds
+    return x, res_time, r
+
+# batched decryption oracle, decrypts all ciphertexts under the key at once
+def decryption_oracle_batch(enc_xs, N, d):
+    start = time.perf_counter_ns()
+    x, h, r = naive_rsa.dec_batch(enc_xs, N, d)
+    res_time = time.perf_counter_ns() - start
     return x, res_time, r
 
-def gen_message_sets(N, d_i, n):
+class ExpState:
+    """
+    Partial decryptions enc_x^d_i mod N of the ciphertexts tracked by the attack.
+    Accepting a bit moves every value forward by one square (and one multiply),
+    backtracking restores the values checkpointed before that bit.
+    """
+    def __init__(self, N, d_i=1, max_checkpoints=64):
+        self.N = N
+        self.d = d_i
+        self.ciphers = []
+        self.values = []
+        # values before each accepted bit, the oldest are dropped past max_checkpoints
+        self.checkpoints = []
+        self.max_checkpoints = max_checkpoints
+
+    def fresh(self):
+        """A ciphertext to track next."""
+        return randrange(0, self.N)
+
+    def fresh_many(self, count):
+        return [self.fresh() for _ in range(count)]
+
+    def add(self, enc_x):
+        """Track a new ciphertext, returns enc_x^d_i mod N."""
+        self.ciphers.append(enc_x)
+        self.values.append(pow(enc_x, self.d, self.N))
+        return self.values[-1]
+
+    def add_many(self, enc_xs):
+        """Track new ciphertexts, their partial decryptions are computed at once for small moduli."""
+        self.ciphers.extend(enc_xs)
+        if not enc_xs:
+            return
+        if self.N.bit_length() <= 32:
+            self.values.extend(naive_rsa.dec_batch(enc_xs, self.N, self.d)[0].tolist())
+        else:
+            self.values.extend(pow(c, self.d, self.N) for c in enc_xs)
+
+    def advance(self, bit):
+        """Append bit to d_i."""
+        N = self.N
+        self.checkpoints.append(self.values)
+        if len(self.checkpoints) > self.max_checkpoints:
+            self.checkpoints.pop(0)
+        if N.bit_length() <= 32:
+            import numpy as np
+            # products of values below 2^32 fit in uint64
+            values = np.array(self.values, dtype=np.uint64)
+            values = values * values % N
+            if bit == 1:
+                values = values * np.array(self.ciphers, dtype=np.uint64) % N
+            self.values = values.tolist()
+        elif bit == 1:
+            self.values = [v * v % N * c % N for v, c in zip(self.values, self.ciphers)]
+        else:
+            self.values = [v * v % N for v in self.values]
+        self.d = self.d * 2 + bit
+
+    def rollback(self):
+        """Drop the last bit of d_i, like backtrack does."""
+        if self.d == 1:
+            return
+        self.d = self.d // 2
+        values = self.checkpoints.pop() if self.checkpoints else []
+        # ciphertexts tracked after the checkpoint (or all of them if it was dropped) are recomputed
+        self.values = values + [pow(c, self.d, self.N) for c in self.ciphers[len(values):]]
+
+    def drop(self, enc_xs):
+        """
+        Stop tracking the given ciphertexts. The oracle is deterministic, so sets built
+        from the same ciphertexts would repeat a rejected decision
+        """
+        enc_xs = set(enc_xs)
+        keep = [i for i, c in enumerate(self.ciphers) if c not in enc_xs]
+        self.ciphers = [self.ciphers[i] for i in keep]
+        self.values = [self.values[i] for i in keep]
+        self.checkpoints = [[cp[i] for i in keep if i < len(cp)] for cp in self.checkpoints]
+
+class CipherPool(ExpState):
+    """
+    ExpState over a pre-sampled pool of ciphertexts which also keeps their oracle measurements.
+    The oracle always decrypts with the full key, so a measurement stays valid for every
+    later bit and each ciphertext is sent to the oracle at most once.
+    Ciphertexts come from source, an iterator (the ciphertexts of a trace), instead of at random if given.
+    """
+    def __init__(self, N, size, d_i=1, max_checkpoints=64, source=None):
+        super().__init__(N, d_i, max_checkpoints)
+        self.source = source
+        #ciphertext -> reductions reported by the oracle
+        self.measured = {}
+        self.queries = 0
+        #measurements and dropped ciphertexts since the last take_log, written to checkpoints
+        self.measured_log = []
+        self.dropped_log = []
+        for _ in range(size):
+            self.add(self.fresh())
+
+    def fresh(self):
+        if self.source is None:
+            return super().fresh()
+        try:
+            return next(self.source)
+        except StopIteration:
+            raise LookupError("ran out of ciphertexts to attack with") from None
+
+    def fresh_many(self, count):
+        if self.source is None:
+            return super().fresh_many(count)
+        # whatever is left of the source, as long as it isn't empty
+        enc_xs = list(islice(self.source, count))
+        if not enc_xs:
+            raise LookupError("ran out of ciphertexts to attack with")
+        return enc_xs
+
+    def measure(self, enc_xs, oracle):
+        """
+        Return the reductions of enc_xs, oracle(list of ciphertexts) -> list of reductions
+        is only asked about ciphertexts that weren't measured yet
+        """
+        new = [c for c in dict.fromkeys(enc_xs) if c not in self.measured]
+        if new:
+            results = list(zip(new, oracle(new)))
+            self.measured.update(results)
+            self.measured_log.extend(results)
+            self.queries = self.queries + len(new)
+        return [self.measured[c] for c in enc_xs]
+
+    def drop(self, enc_xs):
+        super().drop(enc_xs)
+        for c in enc_xs:
+            self.measured.pop(c, None)
+        self.dropped_log.extend(enc_xs)
+
+    def take_log(self):
+        """Return (measurements, dropped ciphertexts) since the last call."""
+        log = self.measured_log, self.dropped_log
+        self.measured_log = []
+        self.dropped_log = []
+        return log
+
+def gen_message_sets(N, d_i, n, state=None, arith="plain"):
     #first list is for j == 0, and second for j == 1
     no_extra_set = [[], []]
     extra_set = [[], []]
-
-    #First assume bit j = 0, then j = 1
-    for bit in (0, 1):
-        while len(no_extra_set[bit]) < n or len(extra_set[bit]) < n:
-            enc_x = randrange(0, N)
-            
-            #simulate decryption up to i 
-            m_temp, _, _ = naive_rsa.dec(enc_x,N, d_i)
-
-            #simulate next decryption step up to the if d_j == 1 part
+    ctx = naive_rsa.montgomery_ctx(N) if arith == "montgomery" else None
+    #ciphertexts tracked by the state are classified first, fresh ones are only drawn when they run out
+    if state is None:
+        state = ExpState(N, d_i)
+    assert state.d == d_i, "attack state is at a different key prefix"
+
+    if ctx is None:
+        import numpy as np
+        #plain arithmetic, the tracked ciphertexts are classified in bulk and fresh ones drawn in growing chunks
+        i = 0
+        chunk = 256
+        while min(len(bucket) for bucket in no_extra_set + extra_set) < n:
+            if i == len(state.ciphers):
+                state.add_many(state.fresh_many(chunk))
+                chunk = min(2 * chunk, 65536)
+            ciphers = state.ciphers[i:]
+            extra = requires_extra_reduction_batch(ciphers, state.values[i:], N)
+            i = len(state.ciphers)
+            for bit in (0, 1):
+                for bucket, mask in ((extra_set[bit], extra[bit]), (no_extra_set[bit], ~extra[bit])):
+                    #only the first ciphertexts of a bucket are kept, in order, same sets as classifying them one by one
+                    bucket.extend(ciphers[j] for j in np.flatnonzero(mask)[:n - len(bucket)])
+        return no_extra_set, extra_set
+
+    #both hypotheses, bit j = 0 and j = 1, are classified in one pass over the ciphertexts
+    i = 0
+    while min(len(bucket) for bucket in no_extra_set + extra_set) < n:
+        #simulate decryption up to i 
+        if i < len(state.ciphers):
+            enc_x, m_temp = state.ciphers[i], state.values[i]
+        else:
+            enc_x = state.fresh()
+            m_temp = state.add(enc_x)
+        i = i + 1
+
+        #simulate next decryption step up to the if d_j == 1 part
+        if ctx is not None:
+            #montgomery decryption keeps its intermediate values in Montgomery form
+            m = naive_rsa.to_mont(enc_x, ctx)
+            m_temp = naive_rsa.to_mont(m_temp, ctx)
+            m_temp, _ = naive_rsa.mont_mul(m_temp, m_temp, ctx)
+        else:
+            m = enc_x
             m_temp = pow(m_temp, 2, N)
 
-            #simulate decryption up to if d_(j+1) == 1 part 
-            #and check if it produces extra reduction
-            extra = requires_extra_reduction(m_temp, enc_x, N, d_i, bit)
+        #simulate decryption up to if d_(j+1) == 1 part 
+        #and check if it produces extra reduction
+        for bit in (0, 1):
+            extra = requires_extra_reduction(m_temp, m, N, d_i, bit, ctx)
             if extra:
                 extra_set[bit].append(enc_x)
             else:
                 no_extra_set[bit].append(enc_x)
 
-    return no_extra_set[:n], extra_set[:n]
+    return [s[:n] for s in no_extra_set], [s[:n] for s in extra_set]
   
-def requires_extra_reduction(m_temp: int, m: int, N: int, d_i: int, bit: int):
+def requires_extra_reduction(m_temp: int, m: int, N: int, d_i: int, bit: int, ctx=None):
     """
     Return true if encrypted message requires extra reduction for bit i
+    With a Montgomery context m_temp and m are in Montgomery form and the extra
+    reduction is the conditional final subtraction of the next squaring
     """
+    if ctx is not None:
+        if bit == 1:
+            m_temp, _ = naive_rsa.mont_mul(m_temp, m, ctx)
+        return naive_rsa.mont_mul(m_temp, m_temp, ctx)[1] == 1
     if bit == 1:
         m_temp = (m_temp * m) % N
     #return true if calculations require extra reduction
     return m_temp * m_temp >= N
 
+def requires_extra_reduction_batch(ciphers, values, N):
+    """
+    requires_extra_reduction of many ciphertexts for both bits at once, values are their partial
+    decryptions enc_x^d_i mod N. Returns the boolean masks (extra if bit is 0, extra if bit is 1).
+    """
+    import numpy as np
+    # products of values below 2^32 fit in uint64, larger moduli use python ints in object arrays
+    dtype = np.uint64 if N.bit_length() <= 32 else object
+    c = np.array(ciphers, dtype=dtype)
+    m_temp = np.array(values, dtype=dtype)
+    #simulate next decryption step up to the if d_j == 1 part
+    m_temp = m_temp * m_temp % N
+    # m^2 >= N  <=>  m >= ceil(sqrt(N)), which saves the squaring that checks for the extra reduction
+    bound = math.isqrt(N - 1) + 1
+    return (m_temp >= bound).astype(bool), (m_temp * c % N >= bound).astype(bool)
+
 def backtrack(d_i):
     return d_i // 2 if d_i != 1 else d_i
 
-def fuzzy_equal(mean_1, mean_2):
-    return abs(mean_1 - mean_2) < 0.3
+def fuzzy_equal(mean_1, mean_2, threshold=0.3):
+    return abs(mean_1 - mean_2) < threshold
 
-def significantly_larger(mean_1, mean_2):
-    return (mean_1 - mean_2) > 0.5
+def significantly_larger(mean_1, mean_2, threshold=0.5):
+    return (mean_1 - mean_2) > threshold
 
 def check_key(a, e):
 #we have to guess the last bit
@@ -82,16 +307,407 @@ def check_key(a, e):
             return (d, True)
 
     return (e["d"], False)
-    
+
+@dataclass
+class AttackResult:
+    #recovered key, or the prefix reached when the attack gave up
+    d: int
+    cracked: bool
+    #oracle queries, measurements and key checks
+    queries: int
+    backtracks: int
+    seconds: float
+    #oracle queries spent in every round, a round accepts a bit, backtracks or stays undecided
+    round_queries: list = field(default_factory=list)
+
+class AttackEngine:
+    """
+    Recover d bit by bit from the reductions an oracle reports, without any terminal output.
+    oracle(enc_x) -> (x, time, reductions) decrypts with the attacked key, measure(list of ciphertexts)
+    -> list of reductions optionally replaces it for bulk measurements (batched or process pool).
+    The observer, if any, is told about every round, see TerminalObserver.
+
+    With decision="sprt" a round measures sets of batch_size ciphertexts and grows them by batch_size.
+    Each bit runs its own sequential probability ratio test, with error rate alpha, of "its sets are
+    separated by delta reductions" against "its sets are the same". A bit is accepted once its test
+    finds the gap and the other bit's test finds none. Any other outcome of both tests (two gaps,
+    no gap at all) or no outcome within max_samples per set gives up the round and backtracks.
+
+    ciphers, if given, are the only ciphertexts the attack uses, for replaying the queries of a
+    trace (trace_file.Trace) without the oracle.
+
+    With a checkpoint (a Checkpoint) every round is logged, run(resume=True) continues from its last line.
+    """
+    def __init__(self, oracle, N, num_samples=32, max_backtracks=10, equal_threshold=0.3, larger_threshold=0.5,
+                 pool_size=1024, arith="plain", measure=None, observer=None,
+                 decision="fixed", batch_size=8, alpha=0.01, delta=1.0, max_samples=None, ciphers=None,
+                 checkpoint=None):
+        self.oracle = oracle
+        self.N = N
+        self.num_samples = num_samples
+        self.max_backtracks = max_backtracks
+        self.equal_threshold = equal_threshold
+        self.larger_threshold = larger_threshold
+        self.pool_size = pool_size
+        self.arith = arith
+        self.measure = measure if measure is not None else (lambda cs: [oracle(c)[2] for c in cs])
+        self.observer = observer
+        if decision not in ("fixed", "sprt"):
+            raise ValueError("unknown decision mode: %s" % decision)
+        self.decision = decision
+        self.batch_size = batch_size
+        self.alpha = alpha
+        self.delta = delta
+        self.max_samples = max_samples if max_samples is not None else 2 * num_samples
+        self.ciphers = ciphers
+        self.checkpoint = checkpoint
+        self.d = 1
+        self.backtracks = 0
+        self.check_queries = 0
+        self.round_queries = []
+        self.pool = None
+
+    @property
+    def queries(self):
+        return self.pool.queries + self.check_queries
+
+    def notify(self, event, *args):
+        if self.observer is not None:
+            getattr(self.observer, event)(self, *args)
+
+    def decide(self, extra_r_set, no_extra_r_set):
+        """Return the next bit of d, or None if the measurements don't single out one hypothesis."""
+        import numpy as np
+        gap = [np.mean(extra_r_set[bit]) - np.mean(no_extra_r_set[bit]) for bit in (0, 1)]
+        for bit in (0, 1):
+            # significant difference in reductions between the extra reduction set and no extra
+            # reduction set for the assumed bit, while the sets for the other bit are roughly the same
+            if (significantly_larger(gap[bit], 0, self.larger_threshold)
+                    and fuzzy_equal(gap[1 - bit], 0, self.equal_threshold)):
+                return bit
+        return None
+
+    def log_likelihood_ratios(self, extra_r_set, no_extra_r_set):
+        """
+        Log-likelihood ratio, for every bit, of its sets being separated by delta against them being
+        the same. The separation of the means is taken as normally distributed around delta or 0.
+        """
+        import numpy as np
+        llr = []
+        for bit in (0, 1):
+            gap = np.mean(extra_r_set[bit]) - np.mean(no_extra_r_set[bit])
+            var = 0
+            for s in (extra_r_set[bit], no_extra_r_set[bit]):
+                # the sets differ in whether one step reduces, a Bernoulli draw with a variance up to
+                # 1/4, reductions constant within a set don't make the separation certain
+                var += max(np.var(s, ddof=1), bernoulli_variance) / len(s)
+            llr.append(self.delta * (gap - self.delta / 2) / var)
+        return llr
+
+    def measure_sets(self, n):
+        """Build the four sets of n ciphertexts for the next bit and measure them."""
+        no_extra_r_ciphers, extra_r_ciphers = gen_message_sets(self.N, self.d, n, self.pool, self.arith)
+        ciphers = no_extra_r_ciphers[0] + no_extra_r_ciphers[1] + extra_r_ciphers[0] + extra_r_ciphers[1]
+        r = self.pool.measure(ciphers, self.measure)
+        no_extra_r_set = [r[:n], r[n:2 * n]]
+        extra_r_set = [r[2 * n:3 * n], r[3 * n:]]
+        return ciphers, extra_r_set, no_extra_r_set
+
+    def sequential_decide(self):
+        """Grow the sets until both tests conclude, returns (bit or None, measured ciphertexts)."""
+        bound = math.log((1 - self.alpha) / self.alpha)
+        n = max(self.batch_size, 2)
+        # per bit, True once its test found the gap, False once it found none
+        outcome = [None, None]
+        while True:
+            # sets only grow, ciphertexts measured in an earlier batch come from the pool's cache
+            ciphers, extra_r_set, no_extra_r_set = self.measure_sets(n)
+            for bit, llr in enumerate(self.log_likelihood_ratios(extra_r_set, no_extra_r_set)):
+                if outcome[bit] is None and abs(llr) >= bound:
+                    outcome[bit] = bool(llr > 0)
+            for bit in (0, 1):
+                if outcome[bit] is True and outcome[1 - bit] is False:
+                    return bit, ciphers
+            if None not in outcome or n >= self.max_samples:
+                # both bits or neither bit separate their sets, or the evidence stays ambiguous
+                return None, ciphers
+            n = min(n + self.batch_size, self.max_samples)
+
+    def step(self):
+        """Run one round of the attack, returns "accept", "backtrack" or "undecided"."""
+        queries = self.pool.queries
+        if self.decision == "sprt":
+            bit, ciphers = self.sequential_decide()
+        else:
+            ciphers, extra_r_set, no_extra_r_set = self.measure_sets(self.num_samples)
+            bit = self.decide(extra_r_set, no_extra_r_set)
+        self.round_queries.append(self.pool.queries - queries)
+
+        if bit is not None:
+            self.d = self.d * 2 + bit
+            self.pool.advance(bit)
+            return "accept"
+        # if for both assumed bits there is a significant difference between extra reduction and no extra reduction sets
+        # or for both assumed bits the reductions in sets are roughly equal, we need to backtrack because
+        # there's was probably a wrongly set bit before
+        self.pool.drop(ciphers)
+        # an undecided first bit also uses up the budget, like in timing_attack_blind, otherwise
+        # an oracle without any signal would keep the attack at d = 1 forever
+        self.backtracks += 1
+        if self.d != 1:
+            self.d = backtrack(self.d)
+            self.pool.rollback()
+            return "backtrack"
+        return "undecided"
+
+    def check_key(self):
+        """Same as check_key, but the real decryption comes from the oracle."""
+        #we have to guess the last bit
+        for bit in (0, 1):
+            d = self.d * 2 + bit
+
+            c_text = randrange(1, self.N) if self.pool.source is None else self.pool.fresh()
+            real_x, _, _ = self.oracle(c_text)
+            self.check_queries += 1
+            guess_x, _, _ = naive_rsa.dec(c_text, self.N, d)
+            if real_x == guess_x:
+                return (d, True)
+
+        return (self.d, False)
+
+    def restore(self, state, source=None):
+        """Continue from a state loaded from a checkpoint, the measured ciphertexts are tracked again."""
+        self.d = state["d"]
+        self.backtracks = state["backtracks"]
+        self.check_queries = state["check_queries"]
+        self.round_queries = state["round_queries"]
+        random.seed(state["seed"])
+        self.pool = CipherPool(self.N, 0, self.d, source=source)
+        self.pool.measured = state["measured"]
+        self.pool.queries = state["queries"]
+        self.pool.add_many(list(self.pool.measured))
+        self.pool.add_many(self.pool.fresh_many(max(self.pool_size - len(self.pool.measured), 0)))
+
+    def run(self, resume=False):
+        start = time.perf_counter()
+        #ciphertexts reused by the attack with their partial decryptions (follow self.d) and oracle measurements
+        source = iter(self.ciphers) if self.ciphers is not None else None
+        state = self.checkpoint.load() if resume and self.checkpoint is not None else None
+        if state is not None and state["cracked"]:
+            # the log ends with the cracked key, nothing is left to query
+            result = AttackResult(state["d"], True, state["queries"] + state["check_queries"], state["backtracks"],
+                                  time.perf_counter() - start, state["round_queries"])
+            self.notify("finish", result)
+            return result
+        if state is not None:
+            self.restore(state, source)
+        else:
+            self.d = 1
+            self.backtracks = 0
+            self.check_queries = 0
+            self.round_queries = []
+            self.pool = CipherPool(self.N, self.pool_size, source=source)
+        self.notify("start")
+
+        while True:
+            self.notify("round_start")
+            outcome = self.step()
+            self.notify("round_end", outcome)
+
+            # check if the key has been cracked, because we don't know how long is the key
+            self.d, cracked = self.check_key()
+            if self.checkpoint is not None:
+                self.checkpoint.write(self, cracked)
+
+            # if the key has been cracked or maximum amount of backtracks has been reached, leave the loop
+            if self.backtracks >= self.max_backtracks or cracked:
+                break
+
+        result = AttackResult(self.d, cracked, self.queries, self.backtracks, time.perf_counter() - start,
+                              self.round_queries)
+        self.notify("finish", result)
+        return result
+
+class Checkpoint:
+    """
+    Append-only JSON lines log of an AttackEngine. The first line describes the attack, then every round
+    adds the prefix, backtracks, query counts, an RNG seed and the oracle measurements (and dropped
+    ciphertexts) since the previous line, so a line costs about what the round measured.
+    The RNG is reseeded with the logged seed, the randomness after a line follows from it.
+    load() folds the log up to the last complete line, a line cut short by a crash is ignored.
+    A log without a header, not started with begin(), gets one with the first round.
+    """
+    def __init__(self, path, every=1):
+        self.path = path
+        self.every = every
+        self.rounds = 0
+
+    def header(self):
+        """The first line of the log, None if there is no log yet."""
+        try:
+            with open(self.path) as f:
+                return json.loads(f.readline())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def begin(self, N, **info):
+        """Start a new log for an attack on N, info is stored with it (e.g. the simulated key)."""
+        with open(self.path, "w") as f:
+            f.write(json.dumps(dict({"N": str(N)}, **info)) + "\n")
+
+    def write(self, engine, cracked=False):
+        self.rounds = self.rounds + 1
+        # the round that cracks the key is always logged, a resumed run returns it
+        if self.rounds % self.every and not cracked:
+            return
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self.begin(engine.N)
+        measured, dropped = engine.pool.take_log()
+        # a seed instead of the whole Mersenne Twister state, which takes about 8 KB per line
+        seed = random.getrandbits(64)
+        random.seed(seed)
+        line = {"d": str(engine.d), "backtracks": engine.backtracks, "check_queries": engine.check_queries,
+                "queries": engine.pool.queries, "round_queries": engine.round_queries[-self.every:],
+                "seed": seed, "cracked": cracked,
+                "measured": [[str(c), int(r)] for c, r in measured], "dropped": [str(c) for c in dropped]}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def load(self):
+        """
+        State of the last complete line, None if no round was logged. The log is cut after
+        that line, a resumed attack appends its rounds there.
+        """
+        state = None
+        measured = {}
+        round_queries = []
+        with open(self.path, "r+") as f:
+            f.readline()
+            good = f.tell()
+            while True:
+                raw = f.readline()
+                if not raw.endswith("\n"):
+                    break
+                try:
+                    line = json.loads(raw)
+                except ValueError:
+                    break
+                good = f.tell()
+                measured.update((int(c), r) for c, r in line["measured"])
+                for c in line["dropped"]:
+                    measured.pop(int(c), None)
+                round_queries.extend(line["round_queries"])
+                state = {"d": int(line["d"]), "backtracks": line["backtracks"], "check_queries": line["check_queries"],
+                         "queries": line["queries"], "seed": line["seed"], "cracked": line["cracked"]}
+            f.truncate(good)
+        if state is not None:
+            state["measured"] = measured
+            state["round_queries"] = round_queries
+        return state
+
+class TerminalObserver:
+    """Draws the progress of an AttackEngine with blessed, comparing the recovered bits with the real key."""
+    def __init__(self, real_d):
+        import blessed
+        self.term = blessed.Terminal()
+        self.real_d = real_d
+        self.backtracking = False
+
+    def print_last_bit(self, d, end=""):
+        term = self.term
+        last_bit = ("{0:b}").format(d)[d.bit_length() - 1]
+        print(term.green(str(last_bit)) if str(last_bit) == ("{0:b}").format(self.real_d)[d.bit_length() - 1] else term.red(str(last_bit)), end=end)
+
+    def start(self, engine):
+        term = self.term
+        print("Starting the crack...")
+        print(term.cyan(("{0:b}").format(self.real_d)))
+        print(term.green("1") + term.gray("_") * (self.real_d.bit_length() - engine.d.bit_length()))
+        print(term.gray("-") * self.real_d.bit_length())
+        print(term.move_up(2) + term.move_right, end="")
+
+    def round_start(self, engine):
+        term = self.term
+        if self.backtracking:
+            print(term.move_left(2), end="")
+            with term.location():
+                print(term.red("*<"))
+            print(term.right, end="")
+            self.backtracking = False
+        else:
+            with term.location():
+                print(term.cyan("*"), end="")
+
+    def round_end(self, engine, outcome):
+        if outcome == "backtrack":
+            self.backtracking = True
+        elif outcome == "undecided":
+            print(self.term.move_left, end="")
+        self.print_last_bit(engine.d)
+
+    def finish(self, engine, result):
+        self.print_last_bit(result.d, end="\n")
+
 if __name__== "__main__":
-    print("RSA modulus is %s bits long, Eve has %s samples" % (n_bits, num_samples))
+    parser = argparse.ArgumentParser(description="Timing attack on the square-and-multiply RSA decryption.")
+    parser.add_argument("--bits", type=int, default=n_bits, help="number of bits of the modulus")
+    parser.add_argument("--samples", type=int, default=num_samples, help="ciphertexts per set")
+    parser.add_argument("--backtracks", type=int, default=max_bactracks, help="maximum amount of backtracks")
+    parser.add_argument("--arith", choices=naive_rsa.ARITHS, default=arith, help="arithmetic of the attacked decryption")
+    parser.add_argument("--workers", type=int, default=workers, help="worker processes measuring oracle queries")
+    parser.add_argument("--seed", type=int, default=seed, help="seed of the attack's randomness")
+    parser.add_argument("--decision", choices=("fixed", "sprt"), default=decision, help="how a bit is decided")
+    parser.add_argument("--alpha", type=float, default=0.01, help="error rate of the sprt decision")
+    parser.add_argument("--headless", action="store_true", help="no terminal drawing, print the result only")
+    parser.add_argument("--capture", metavar="PATH", help="only query the oracle about random ciphertexts and record them to a trace")
+    parser.add_argument("--queries", type=int, default=100000, help="oracle queries recorded by --capture")
+    parser.add_argument("--replay", metavar="PATH", help="attack the queries recorded in a trace, without the oracle")
+    parser.add_argument("--checkpoint", metavar="PATH", help="log every round to this append-only file")
+    parser.add_argument("--resume", action="store_true", help="continue the attack logged in --checkpoint")
+    args = parser.parse_args()
+    # the trace format and the worker pool are only loaded by the modes that use them
+    if args.replay or args.capture:
+        import trace_file
+    if args.workers > 1:
+        import oracle_pool
+
+    if args.replay:
+        # offline analysis, the key is unknown and the oracle is the trace
+        trace = trace_file.Trace(args.replay)
+        print("Replaying %s queries under a %s bit modulus from %s" % (trace.count, trace.N.bit_length(), args.replay))
+        engine = AttackEngine(trace.replay_oracle(), trace.N, args.samples, args.backtracks,
+                              pool_size=min(pool_size, trace.count), arith=trace.arith,
+                              decision=args.decision, alpha=args.alpha, ciphers=trace.ciphers())
+        try:
+            result = engine.run()
+        except LookupError as e:
+            sys.exit("%s, capture a bigger trace with --queries" % e)
+        print("%s oracle queries replayed, %s backtracks, %.2fs" % (result.queries, result.backtracks, result.seconds))
+        print(("Cracking complete, the key is:") if result.cracked else "Couldn't crack the key :( try again!")
+        print(("{0:b}").format(result.d))
+        sys.exit(0)
+
+    print("RSA modulus is %s bits long, Eve has %s samples" % (args.bits, args.samples))
+    if args.seed is not None:
+        random.seed(args.seed)
     #Alice is the party encrypting the message
     alice = {}
     #Eve is the attacker, she eavesdrops on the communcation protocol and know x, N, enc_x_s
     eve = {}
 
-    #Keygen phase
-    alice["N"], alice["e"], alice["d"], alice["p"], alice["q"] = key_gen(n_bits)
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    if args.resume and (checkpoint is None or checkpoint.header() is None):
+        sys.exit("--resume needs the log of an attack in --checkpoint")
+
+    #Keygen phase, a resumed attack continues on the key it was logged with
+    if args.resume:
+        header = checkpoint.header()
+        for k in ("N", "e", "d", "p", "q"):
+            alice[k] = int(header[k])
+    else:
+        alice["N"], alice["e"], alice["d"], alice["p"], alice["q"] = key_gen(args.bits)
+        if checkpoint is not None:
+            checkpoint.begin(alice["N"], **{k: str(alice[k]) for k in ("e", "d", "p", "q")})
     print("Modulus of the key is %s" % alice["N"])
     print("Private key is %s" % alice["d"])
     print( ("{0:b}").format(alice["d"]))
@@ -103,108 +719,40 @@ if __name__== "__main__":
     #Alice knows every parameter of RSA
     print("Alice knows: ", alice.keys())
 
-    l = 1
-    eve["d"] = 1
-    backtracks = 0
-    backtracking = False    
-
-    term = blessed.Terminal()
-    print("Starting the crack...")
-    print(term.cyan(("{0:b}").format(alice["d"])))
-    print(term.green("1") + term.gray("_") * (alice["d"].bit_length() - eve["d"].bit_length()))
-    print(term.gray("-") * alice["d"].bit_length())
-    print(term.move_up(2) + term.move_right, end="")
-
-    last_bit = 1
-    while True:
-        # just printing stuff
-        if backtracking:
-            print(term.move_left(2), end="")
-            with term.location():
-                print(term.red("*<"))
-            print(term.right, end="")
-            backtracking = False
-        else:
-            #print(term.move_right, end="")
-            with term.location():
-                print(term.cyan("*"), end="")
-            
-
-        # generate sets of ciphertexts:
-        # 1st set: We assume that the next bit of private key is equal to 0
-        #   and we search for ciphertexts that generate extra reduction
-        # 2nd set: We assume that the next bit of private key is equal to 0
-        #   and we search for ciphertexts that do not generate extra reduction
-        # 3rd set: We assume that the next bit of private key is equal to 1
-        #   and we search for ciphertexts that generate extra reduction
-        # 4th set: We assume that the next bit of private key is equal to 1
-        #   and we search for ciphertexts that do not generate extra reduction
-        no_extra_r_ciphers, extra_r_ciphers = gen_message_sets(eve["N"], eve["d"], num_samples)
-        extra_r_set = [[], []]
-        no_extra_r_set = [[], []]
-
-        # ask decryption oracle to dec
-        for bit in (0, 1):
-            for c_text in no_extra_r_ciphers[bit]:
-                _, res_time, r = decryption_oracle(c_text, alice["N"], alice["d"])
-                no_extra_r_set[bit].append(r)
-            for c_text in extra_r_ciphers[bit]:
-                _, res_time, r = decryption_oracle(c_text, alice["N"], alice["d"])
-                extra_r_set[bit].append(r)
-
-        # sets generated on premise that the next bit is equal to 0
-        extra_r_0bit = np.array(extra_r_set[0])
-        no_extra_r_0bit = np.array(no_extra_r_set[0])
-
-        # sets generated on premise that the next bit is equal to 1
-        extra_r_1bit = np.array(extra_r_set[1])
-        no_extra_r_1bit = np.array(no_extra_r_set[1])
-
-        # check if there's a significant difference in time (reductions) between extra reduction set and 
-        # no extra reduction set for assumed bit 0 and at the same time that reductions for sets with assumed bit 1
-        # are roughly the same
-        if (significantly_larger(extra_r_0bit.mean(), no_extra_r_0bit.mean()) and fuzzy_equal(extra_r_1bit.mean(), no_extra_r_1bit.mean())):
-            eve["d"] = eve["d"] * 2
-            last_bit = 0
-        # check if there's a significant difference in time (reductions) between extra reduction set and 
-        # no extra reduction set for assumed bit 1 and at the same time that reductions for sets with assumed bit 0
-        # are roughly the same
-        elif (significantly_larger(extra_r_1bit.mean(), no_extra_r_1bit.mean()) and fuzzy_equal(extra_r_0bit.mean(), no_extra_r_0bit.mean())):
-            eve["d"] = eve["d"] * 2 + 1
-            last_bit = 1
-        # if for both assumed bits there is a significant difference between extra reduction and no extra reduction sets
-        # or for both assumed bits the reductions in sets are roughly equal, we need to backtrack because
-        # there's was probably a wrongly set bit before
-        elif eve["d"] != 1:
-            eve["d"] = backtrack(eve["d"])
-            
-            backtracks += 1
-            backtracking = True
-        else:
-            print(term.move_left, end="")
-
-        # just printing stuff
-        last_bit = ("{0:b}").format(eve["d"])[eve["d"].bit_length() - 1]
-        print(term.green(str(last_bit)) if str(last_bit) == ("{0:b}").format(alice["d"])[eve["d"].bit_length() - 1] else term.red(str(last_bit)), end="")
-
-        # check if the key has been cracked, because we don't know how long is the key
-        eve["d"], cracked = check_key(alice, eve)
-
-        # if the key has been cracked or maximum amount of backtracks has been reached, leave the loop
-        if(backtracks >= max_bactracks) or cracked:
-            last_bit = ("{0:b}").format(eve["d"])[eve["d"].bit_length() - 1]
-            print(term.green(str(last_bit)) if str(last_bit) == ("{0:b}").format(alice["d"])[eve["d"].bit_length() - 1] else term.red(str(last_bit)))
+    oracle = partial(decryption_oracle, N=alice["N"], d=alice["d"], arith=args.arith)
+    if args.capture:
+        # collect once on the target, the trace is then attacked with --replay as many times as needed
+        with trace_file.TraceWriter(args.capture, alice["N"], args.arith) as writer:
+            recorded = writer.recording(oracle)
+            for _ in range(args.queries):
+                recorded(randrange(0, alice["N"]))
+        print("Recorded %s oracle queries to %s" % (args.queries, args.capture))
+        sys.exit(0)
+
+    # ask decryption oracle to dec, only about ciphertexts the pool hasn't measured yet
+    measurer = None
+    if args.workers > 1:
+        # the key is shipped to every worker once, ciphertexts are sharded over them
+        measurer = oracle_pool.OraclePool(decryption_oracle, (alice["N"], alice["d"], None, args.arith), args.workers, random.getrandbits(64))
+        measure = lambda cs: measurer.measure(cs)[0]
+    elif args.arith == "plain":
+        # dec_batch only models the plain arithmetic
+        measure = lambda cs: decryption_oracle_batch(cs, alice["N"], alice["d"])[2].tolist()
+    else:
+        measure = None
 
-            break
+    engine = AttackEngine(oracle, eve["N"], args.samples, args.backtracks, pool_size=pool_size, arith=args.arith,
+                          measure=measure, observer=None if args.headless else TerminalObserver(alice["d"]),
+                          decision=args.decision, alpha=args.alpha, checkpoint=checkpoint)
+    result = engine.run(resume=args.resume)
+    eve["d"] = result.d
+    if measurer is not None:
+        measurer.close()
 
     # Key is cracked now, check the results
-
+    print("Eve made %s oracle queries, %s backtracks, %.2fs" % (result.queries, result.backtracks, result.seconds))
     if (eve["d"] != alice["d"]):
-        print(term.red("Couldn't crack the key :( try again!"))
+        print("Couldn't crack the key :( try again!")
     else:
         print(("Cracking complete, the key is:"))
-        print(term.blue(("{0:b}").format(eve["d"])))
-
-
-
-#print( ("{0:b}" % (n_bits)).format(alice["d"]))
+        print(("{0:b}").format(eve["d"]))
@@ -0,0 +1,128 @@
+import json
+import os
+import numpy as np
+
+# columns of a trace, one little-endian file each in the trace directory
+COLUMNS = ("cipher", "plain", "reductions", "ns")
+
+def column_file(path, name):
+    return os.path.join(path, name + ".bin")
+
+def meta_file(path):
+    return os.path.join(path, "meta.json")
+
+class TraceWriter:
+    """
+    Stream oracle queries (ciphertext, plaintext, reductions, ns timing) into a trace directory.
+    Ciphertexts and plaintexts are stored as a fixed number of uint64 limbs, reductions and timings
+    as int64, so every column can be np.memmap'd. Writing to an existing trace appends to it, after
+    cutting the partial last record an interrupted capture may have left.
+    """
+    def __init__(self, path, N, arith="plain"):
+        self.path = path
+        self.N = N
+        self.limbs = -(-N.bit_length() // 64)
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(meta_file(path)):
+            trace = Trace(path)
+            if trace.N != N:
+                raise ValueError("trace %s was captured under another modulus" % path)
+            if trace.arith != arith:
+                raise ValueError("trace %s was captured with %s arithmetic" % (path, trace.arith))
+            # every column is cut to the records complete in all of them, so appended records line up
+            for name, width in trace.widths.items():
+                with open(column_file(path, name), "ab") as f:
+                    f.truncate(trace.count * width)
+        else:
+            with open(meta_file(path), "w") as f:
+                json.dump({"N": str(N), "limbs": self.limbs, "arith": arith}, f)
+        self.files = {name: open(column_file(path, name), "ab") for name in COLUMNS}
+        self.count = 0
+
+    def write(self, cipher, plain, reductions, ns):
+        size = 8 * self.limbs
+        self.files["cipher"].write(cipher.to_bytes(size, "little"))
+        self.files["plain"].write(plain.to_bytes(size, "little"))
+        self.files["reductions"].write(int(reductions).to_bytes(8, "little", signed=True))
+        self.files["ns"].write(int(ns).to_bytes(8, "little", signed=True))
+        self.count = self.count + 1
+
+    def recording(self, oracle):
+        """oracle(enc_x) -> (x, time, reductions) which also writes every query to the trace."""
+        def recorded(enc_x):
+            x, res_time, r = oracle(enc_x)
+            self.write(enc_x, x, r, res_time)
+            return x, res_time, r
+        return recorded
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Trace:
+    """
+    A trace directory written by TraceWriter, its columns memory mapped:
+    cipher and plain are (count, limbs) uint64 arrays, reductions and ns int64 arrays.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(meta_file(path)) as f:
+            meta = json.load(f)
+        self.N = int(meta["N"])
+        self.limbs = meta["limbs"]
+        self.arith = meta.get("arith", "plain")
+        self.widths = {"cipher": 8 * self.limbs, "plain": 8 * self.limbs, "reductions": 8, "ns": 8}
+        # an interrupted capture can leave a partial last record behind
+        self.count = min(os.path.getsize(column_file(path, name)) // self.widths[name] for name in COLUMNS)
+        self.cipher = self.column("cipher", "<u8", (self.count, self.limbs))
+        self.plain = self.column("plain", "<u8", (self.count, self.limbs))
+        self.reductions = self.column("reductions", "<i8", (self.count,))
+        self.ns = self.column("ns", "<i8", (self.count,))
+
+    def column(self, name, dtype, shape):
+        if self.count == 0:
+            # empty files can't be mapped
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(column_file(self.path, name), dtype=dtype, mode="r", shape=shape)
+
+    def ints(self, column):
+        """Python ints of a limb column (cipher or plain), read from the mapping one record at a time."""
+        for row in column:
+            yield int.from_bytes(row.tobytes(), "little")
+
+    def ciphers(self):
+        return self.ints(self.cipher)
+
+    def index(self):
+        """
+        (order, top): the records sorted by ciphertext and the most significant limb of the ciphertexts
+        in that order, 16 bytes per record next to the mapped columns.
+        """
+        # lexsort sorts by its last key first, the most significant limb
+        order = np.lexsort(self.cipher.T)
+        return order, np.ascontiguousarray(self.cipher[order, -1])
+
+    def replay_oracle(self):
+        """oracle(enc_x) -> (x, time, reductions) answering from the trace, without the key."""
+        order, top = self.index()
+        size = 8 * self.limbs
+        def replay(enc_x):
+            try:
+                limbs = np.frombuffer(enc_x.to_bytes(size, "little"), dtype="<u8")
+            except OverflowError:
+                limbs = None
+            if limbs is not None:
+                # the top limb leaves a few records, compared whole
+                lo, hi = np.searchsorted(top, limbs[-1], "left"), np.searchsorted(top, limbs[-1], "right")
+                found = np.flatnonzero((self.cipher[order[lo:hi]] == limbs).all(axis=1))
+                if len(found):
+                    i = order[lo + found[0]]
+                    return int.from_bytes(self.plain[i].tobytes(), "little"), int(self.ns[i]), int(self.reductions[i])
+            raise LookupError("ciphertext %s isn't in the trace %s" % (enc_x, self.path))
+        return replay
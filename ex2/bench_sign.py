@@ -0,0 +1,60 @@
+from blind_signature import blind_signature
+import bigint
+import os
+import random
+import time
+
+#modulus sizes to benchmark
+sizes = (1024, 2048)
+#messages signed per size and method
+messages = 64
+#worker processes of the batch signer
+workers = os.cpu_count()
+#signatures checked per size by the verification benchmark
+verifications = 2048
+
+def signatures_per_second(sign, count):
+    start = time.perf_counter()
+    sign()
+    return count / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    # verify and verify_batch both run on the backend's integers, gmpy2 when it is installed
+    print("bigint backend: %s" % bigint.BACKEND)
+    print("%6s %30s %10s" % ("bits", "method", "sigs/s"))
+    for bits in sizes:
+        # GenRSA draws primes of len(w) // 2 + 1 bits
+        signer = blind_signature.signer(bits - 2)
+        provider = blind_signature.provider(signer.N, signer.e)
+        xs = [random.randrange(signer.N) for _ in range(messages)]
+
+        # full size c^d mod N, one message per call
+        crt, signer.crt = signer.crt, None
+        rate = signatures_per_second(lambda: [signer.s_prim(x) for x in xs], messages)
+        print("%6d %30s %10.1f" % (bits, "s_prim loop", rate))
+        signer.crt = crt
+
+        rate = signatures_per_second(lambda: signer.s_prim_batch(xs), messages)
+        print("%6d %30s %10.1f" % (bits, "s_prim_batch, CRT", rate))
+        rate = signatures_per_second(lambda: signer.s_prim_batch(xs, workers), messages)
+        print("%6d %30s %10.1f" % (bits, "s_prim_batch, CRT, %d workers" % workers, rate))
+
+        # whole protocol: blind, sign, unblind
+        signed = []
+        blind_sign = lambda: signed.extend(provider.c_prim_batch(signer.s_prim_batch(provider.c_batch(xs), workers)))
+        rate = signatures_per_second(blind_sign, messages)
+        assert all(signer.verify(x, s) for x, s in zip(xs, signed))
+        print("%6d %30s %10.1f" % (bits, "c/s_prim/c_prim batch", rate))
+
+        # verification of many signatures under the same key
+        vs = [random.randrange(1, signer.N) for _ in range(verifications)]
+        sigs = signer.s_prim_batch(vs, workers)
+        loop = signatures_per_second(lambda: [signer.verify(v, s) for v, s in zip(vs, sigs)], verifications)
+        print("%6d %30s %10.1f" % (bits, "verify loop", loop))
+        rate = signatures_per_second(lambda: signer.verify_batch(vs, sigs), verifications)
+        print("%6d %30s %10.1f  %.1fx the loop" % (bits, "verify_batch", rate, rate / loop))
+        rate = signatures_per_second(lambda: signer.verify_batch(vs, sigs, security=16), verifications)
+        print("%6d %30s %10.1f" % (bits, "verify_batch, 16 bit security", rate))
+        sigs[0] += 1
+        rate = signatures_per_second(lambda: signer.verify_batch(vs, sigs), verifications)
+        print("%6d %30s %10.1f" % (bits, "verify_batch, one bad", rate))
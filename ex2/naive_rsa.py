@@ -1,36 +1,373 @@
-from sympy import randprime, mod_inverse
+import bigint
+import primegen
+from collections import namedtuple
+from functools import lru_cache
+from array import array
+import time
 
-def GenModulus(w):
+# per-key CRT parameters: dp = d mod p-1, dq = d mod q-1, qinv = q^-1 mod p
+crt_key = namedtuple("crt_key", "p q dp dq qinv")
+
+def GenModulus(w, pool=None):
+    # primes come from the on-disk pool (primegen.PrimePool, or the PRIME_POOL directory) when there is one
     n = len(w) // 2
-    p = randprime(2 ** n, 2 ** (n+1))
-    q = randprime(2 ** n, 2 ** (n+1))
+    pool = pool if pool is not None else primegen.default_pool()
+    if pool is not None:
+        p, q = pool.take(n + 1, 2)
+    else:
+        p = primegen.random_prime(n + 1)
+        q = primegen.random_prime(n + 1)
+    # p == q is likely for small moduli and breaks the CRT parameters
+    while q == p:
+        q = primegen.random_prime(n + 1)
     N = p * q
     return N, p, q
 
-def GenRSA(w):
-    N, p, q = GenModulus(w)
+def GenRSA(w, pool=None):
+    N, p, q = GenModulus(w, pool)
     m = (p-1) * (q-1)
     e = 2 ** 16 + 1
-    d = mod_inverse(e, m)
+    d = bigint.invert(e, m)
     return N, e, d, p, q
 
-def enc(x, N, e):
-    return fast_pow(x, N, e) #x ** e % N
+def enc(x, N, e, mode="binary", arith="plain", trace=None):
+    return fast_pow(x, N, e, mode, arith=arith, trace=trace) #x ** e % N
+
+def dec(c, N, d, mode="binary", arith="plain", trace=None):
+    if trace is None:
+        return fast_pow(c, N, d, mode, arith=arith) #c ** d % N
+    start = time.perf_counter_ns()
+    result = fast_pow(c, N, d, mode, arith=arith, trace=trace)
+    trace.add_phase("exponentiation", time.perf_counter_ns() - start)
+    return result
+
+def dec_batch(ciphers, N, d):
+    """
+    Decrypt many ciphertexts under one key, square-and-multiply runs on the whole array at once.
+    Returns arrays (x, h, reductions), counted per ciphertext like dec does.
+    """
+    # numpy is only loaded by the batched path, signing and single decryptions don't need it
+    import numpy as np
+    # products of values below 2^32 fit in uint64, larger moduli use python ints in object arrays.
+    # Ciphertexts aren't reduced mod N first, like in dec, so they have to fit as well.
+    ciphers = list(ciphers)
+    small = N.bit_length() <= 32 and all(0 <= c < 2 ** 32 for c in ciphers)
+    c = np.array(ciphers, dtype=np.uint64 if small else object)
+    x = c.copy()
+    reductions = np.zeros(len(c), dtype=np.int64)
+    h = 0
+    for bit in exp_plan(d):
+        x = x * x
+        r = (x >= N).astype(bool)
+        x = x % N
+        reductions += r
+        if bit:
+            x = x * c
+            r = (x >= N).astype(bool)
+            x = x % N
+            reductions += r
+            h = h + 1
+    return x, np.full(len(c), h), reductions
+
+@lru_cache(maxsize=128)
+def crt_params(p, q, d):
+    """Precompute the CRT parameters of a key, computed once per (p, q, d)."""
+    return crt_key(p, q, d % (p - 1), d % (q - 1), bigint.invert(q, p))
+
+def dec_crt(c, key, mode="binary", arith="plain", trace=None):
+    """
+    Decrypt with two half-size exponentiations mod p and mod q.
+    Returns (x, (hp, hq), (rp, rq)), h and reductions are reported separately for both halves.
+    """
+    clock = time.perf_counter_ns
+    start = clock()
+    xp, hp, rp = fast_pow(c % key.p, key.p, key.dp, mode, arith=arith, trace=trace)
+    xq, hq, rq = fast_pow(c % key.q, key.q, key.dq, mode, arith=arith, trace=trace)
+    mid = clock()
+    # Garner's recombination, x = xq + q * ((xp - xq) * q^-1 mod p)
+    x = xq + key.q * ((xp - xq) * key.qinv % key.p)
+    if trace is not None:
+        trace.add_phase("exponentiation", mid - start)
+        trace.add_phase("recombination", clock() - mid)
+    return x, (hp, hq), (rp, rq)
+
+# exponentiation modes understood by fast_pow
+POW_MODES = ("binary", "kary", "sliding", "naf", "ladder")
+# modular arithmetic backends understood by fast_pow
+ARITHS = ("plain", "montgomery")
+
+# kinds of the steps recorded by StepTrace
+SQUARE = 0
+MULTIPLY = 1
+
+class StepTrace:
+    """
+    perf_counter_ns timings of a decryption, recorded into arrays preallocated for capacity steps.
+    Step i was kinds[i] (SQUARE or MULTIPLY), took ns[i] nanoseconds and needed a reduction if reduced[i].
+    phases holds the nanoseconds spent per phase of the decryption (blinding, exponentiation, ...).
+    Steps past the capacity are counted but not stored.
+    """
+    def __init__(self, capacity=4096):
+        self.kinds = array("b", bytes(capacity))
+        self.ns = array("q", bytes(8 * capacity))
+        self.reduced = array("b", bytes(capacity))
+        self.count = 0
+        self.phases = {}
+
+    def reset(self):
+        self.count = 0
+        self.phases = {}
+
+    def add_phase(self, name, ns):
+        self.phases[name] = self.phases.get(name, 0) + ns
 
-def dec(c, N, d):
-    return fast_pow(c, N, d) #c ** d % N
+    def steps(self):
+        """(kinds, ns, reduced) of the recorded steps."""
+        n = min(self.count, len(self.ns))
+        return self.kinds[:n], self.ns[:n], self.reduced[:n]
 
-def fast_pow(c, N, d):
+    def wrap(self, mul):
+        """Timed version of a fast_pow mul(a, b), squarings are the calls with a is b."""
+        kinds, ns, reduced = self.kinds, self.ns, self.reduced
+        capacity = len(ns)
+        clock = time.perf_counter_ns
+        def timed_mul(a, b):
+            start = clock()
+            x, r = mul(a, b)
+            stop = clock()
+            i = self.count
+            if i < capacity:
+                kinds[i] = SQUARE if a is b else MULTIPLY
+                ns[i] = stop - start
+                reduced[i] = r
+            self.count = i + 1
+            return x, r
+        return timed_mul
+
+def fast_pow(c, N, d, mode="binary", w=4, arith="plain", trace=None):
+    """
+    Return (c^d mod N, h, reductions), where h is the number of multiplications
+    by a power of c and reductions the number of steps that needed a reduction.
+    Window modes also count the reductions spent on their precomputed table.
+    With the montgomery backend reductions are the conditional final subtractions.
+    Every step is timed into trace (a StepTrace) if one is given.
+    The loop runs on the bigint backend's integers, the result is a python int.
+    The ladder mode brings its own arithmetic, see ladder_pow, arith doesn't apply to it.
+    """
+    if mode == "ladder":
+        return ladder_pow(c, N, d, trace)
+    c0 = c
+    c = bigint.mpz(c)
+    if arith == "plain":
+        N = bigint.mpz(N)
+        def mul(a, b):
+            # mod_reduce(a * b, N) inlined, this is the hot loop
+            a = a * b
+            if a >= N:
+                return a % N, 1
+            return a, 0
+        if trace is not None:
+            mul = trace.wrap(mul)
+        inverse = lambda: bigint.mpz(bigint.invert(c0 % N, N))
+        x, h, reductions = pow_loop(c, d, mul, 1 % N, mode, w, inverse)
+        return int(x), h, reductions
+    if arith == "montgomery":
+        # the context stays in python ints, it is shared with the attack's model of the decryption
+        ctx = montgomery_ctx(N)
+        N = bigint.mpz(N)
+        n, mask, N_prim = ctx.n, bigint.mpz(ctx.mask), bigint.mpz(ctx.N_prim)
+        def mul(a, b):
+            # mont_mul(a, b, ctx) inlined
+            T = a * b
+            t = (T + (((T & mask) * N_prim) & mask) * N) >> n
+            if t >= N:
+                return t - N, 1
+            return t, 0
+        if trace is not None:
+            mul = trace.wrap(mul)
+        inverse = lambda: bigint.mpz(to_mont(bigint.invert(c0 % ctx.N, ctx.N), ctx))
+        x, h, reductions = pow_loop(to_mont(c, ctx), d, mul, ctx.R % N, mode, w, inverse)
+        return int(from_mont(x, ctx)), h, reductions
+    raise ValueError("unknown arithmetic backend: %s" % arith)
+
+def pow_loop(c, d, mul, one, mode, w, inverse=None):
+    """
+    Run the exponentiation of the given mode, mul(a, b) returns (a * b reduced, reductions).
+    inverse() returns c^-1 in the same representation as c, only the naf mode needs it.
+    """
+    if mode == "binary":
+        return binary_pow(c, exp_plan(d, mode), mul)
+    if d == 0:
+        return one, 0, 0
+    if mode == "kary":
+        return kary_pow(c, exp_plan(d, mode, w), mul, one, w)
+    if mode == "sliding":
+        return sliding_pow(c, exp_plan(d, mode, w), mul, w)
+    if mode == "naf":
+        try:
+            c_inv = inverse()
+        except ValueError:
+            # c shares a factor with N, there is no c^-1 to multiply with
+            return binary_pow(c, exp_plan(d, "binary"), mul)
+        return naf_pow(c, c_inv, exp_plan(d, mode), mul)
+    raise ValueError("unknown exponentiation mode: %s" % mode)
+
+@lru_cache(maxsize=256)
+def exp_plan(d, mode="binary", w=4):
+    """
+    Recode the exponent d once for an exponentiation mode, the plans are cached per key:
+    binary - the bits of d after the leading 1, as bytes
+    kary - (first digit, following digits) of d in w bit digits, most significant first
+    sliding - (first odd power index, (squarings, odd power index or -1) steps)
+    naf - the non-adjacent form digits (-1, 0, 1) of d after the leading 1
+    ladder - all the bits of d, as bytes
+    """
     d_bin = "{0:b}".format(d)
-    d_len = len(d_bin)
+    if mode == "binary":
+        return bytes(int(bit) for bit in d_bin[1:])
+    if mode == "kary":
+        mask = 2 ** w - 1
+        digits = []
+        while d:
+            digits.append(d & mask)
+            d >>= w
+        digits.reverse()
+        return digits[0], tuple(digits[1:])
+    if mode == "sliding":
+        d_len = len(d_bin)
+        first = None
+        steps = []
+        squarings = 0
+        i = 0
+        while i < d_len:
+            if d_bin[i] == "0":
+                squarings = squarings + 1
+                i = i + 1
+                continue
+            # longest window of at most w bits which ends with a 1
+            j = min(i + w, d_len)
+            while d_bin[j - 1] == "0":
+                j = j - 1
+            digit = int(d_bin[i:j], 2)
+            if first is None:
+                first = digit // 2
+            else:
+                steps.append((squarings + j - i, digit // 2))
+            squarings = 0
+            i = j
+        if squarings:
+            steps.append((squarings, -1))
+        return first, tuple(steps)
+    if mode == "ladder":
+        return bytes(int(bit) for bit in d_bin)
+    if mode == "naf":
+        digits = []
+        while d:
+            digit = 2 - (d & 3) if d & 1 else 0
+            digits.append(digit)
+            d = (d - digit) >> 1
+        # the leading digit is always 1
+        return tuple(reversed(digits[:-1]))
+    raise ValueError("unknown exponentiation mode: %s" % mode)
+
+def binary_pow(c, plan, mul):
+    reductions = 0
+    h = 0
+    x = c
+    for bit in plan:
+        x, r = mul(x, x)
+        reductions = reductions + r
+        if bit:
+            x, r = mul(x, c)
+            reductions = reductions + r
+            h = h + 1
+    return x, h, reductions
+
+def ladder_pow(c, N, d, trace=None):
+    """
+    Montgomery ladder, every bit of d costs one multiplication and one squaring whatever its value.
+    The Montgomery arithmetic has R > 4N, values stay below 2N without the conditional final
+    subtraction, so no step depends on the data. Returns (c^d mod N, h, 0), h is the bit length of d.
+    """
+    ctx = montgomery_ctx(N, spare_bits=2)
+    n, mask, N_prim = ctx.n, bigint.mpz(ctx.mask), bigint.mpz(ctx.N_prim)
+    N = bigint.mpz(N)
+    def mul(a, b):
+        T = a * b
+        return (T + (((T & mask) * N_prim) & mask) * N) >> n, 0
+    # only the ladder steps are traced, not the conversions to and from Montgomery form
+    step = trace.wrap(mul) if trace is not None else mul
+    # x[0] = c^k and x[1] = c^(k+1) for the prefix k of d read so far, in Montgomery form
+    x = [bigint.mpz(ctx.R % N), mul(bigint.mpz(c) % N, bigint.mpz(ctx.R2))[0]]
+    for bit in exp_plan(d, "ladder"):
+        # the bit picks the registers instead of a branch
+        x[1 - bit] = step(x[0], x[1])[0]
+        x[bit] = step(x[bit], x[bit])[0]
+    return int(mul(x[0], 1)[0] % N), d.bit_length(), 0
+
+def naf_pow(c, c_inv, plan, mul):
+    """Square-and-multiply over the signed digits of d, a -1 digit multiplies by c^-1."""
     reductions = 0
     h = 0
     x = c
-    for j in range(1, d_len):
-        x, r = mod_reduce(x ** 2, N)
+    for digit in plan:
+        x, r = mul(x, x)
+        reductions = reductions + r
+        if digit:
+            x, r = mul(x, c if digit > 0 else c_inv)
+            reductions = reductions + r
+            h = h + 1
+    return x, h, reductions
+
+def pow_table(c, mul, one, w, odd=False):
+    """
+    Precompute the powers of c used by the window modes:
+    c^0 .. c^(2^w - 1), or only the odd powers c^1, c^3 .. c^(2^w - 1) if odd.
+    """
+    reductions = 0
+    if odd:
+        table = [c]
+        step, r = mul(c, c)
+        reductions = reductions + r
+        count = 2 ** (w - 1) - 1
+    else:
+        table = [one, c]
+        step = c
+        count = 2 ** w - 2
+    for _ in range(count):
+        x, r = mul(table[-1], step)
         reductions = reductions + r
-        if d_bin[j] == "1":
-            x, r = mod_reduce(x * c, N)
+        table.append(x)
+    return table, reductions
+
+def kary_pow(c, plan, mul, one, w=4):
+    """Fixed-window exponentiation, consumes w bits of d per table multiplication."""
+    table, reductions = pow_table(c, mul, one, w)
+    first, digits = plan
+    h = 0
+    x = table[first]
+    for digit in digits:
+        for _ in range(w):
+            x, r = mul(x, x)
+            reductions = reductions + r
+        if digit:
+            x, r = mul(x, table[digit])
+            reductions = reductions + r
+            h = h + 1
+    return x, h, reductions
+
+def sliding_pow(c, plan, mul, w=4):
+    """Sliding-window exponentiation, windows always end in a 1 bit so only odd powers are needed."""
+    table, reductions = pow_table(c, mul, None, w, odd=True)
+    first, steps = plan
+    h = 0
+    x = table[first]
+    for squarings, index in steps:
+        for _ in range(squarings):
+            x, r = mul(x, x)
+            reductions = reductions + r
+        if index >= 0:
+            x, r = mul(x, table[index])
             reductions = reductions + r
             h = h + 1
     return x, h, reductions
@@ -41,3 +378,36 @@ def mod_reduce(a, b):
         a = a % b
         reductions = 1
     return a, reductions
+
+# Montgomery constants of an odd modulus N: R = 2^n > N, R2 = R^2 mod N, N_prim = -N^-1 mod R
+mont_ctx = namedtuple("mont_ctx", "N n mask R R2 N_prim")
+
+@lru_cache(maxsize=128)
+def montgomery_ctx(N, spare_bits=0):
+    """
+    Precompute the Montgomery context of N, computed once per modulus.
+    spare_bits widens R beyond N, with 2 spare bits R > 4N (see ladder_pow).
+    """
+    if N % 2 == 0:
+        raise ValueError("Montgomery arithmetic needs an odd modulus")
+    n = N.bit_length() + spare_bits
+    R = 1 << n
+    return mont_ctx(N, n, R - 1, R, R * R % N, -pow(N, -1, R) % R)
+
+def mont_mul(a, b, ctx):
+    """
+    Montgomery product a * b * R^-1 mod N of two values in Montgomery form.
+    Returns (t, extra), extra is 1 if the result needed the final conditional subtraction.
+    """
+    T = a * b
+    m = ((T & ctx.mask) * ctx.N_prim) & ctx.mask
+    t = (T + m * ctx.N) >> ctx.n
+    if t >= ctx.N:
+        return t - ctx.N, 1
+    return t, 0
+
+def to_mont(x, ctx):
+    return mont_mul(x % ctx.N, ctx.R2, ctx)[0]
+
+def from_mont(x, ctx):
+    return mont_mul(x, 1, ctx)[0]
@@ -0,0 +1,72 @@
+import rsa_blinded
+import os
+import random
+import sys
+import time
+
+# the attack engine lives in ex1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex1"))
+
+#modulus sizes to benchmark
+sizes = (1024, 2048)
+#decryptions per size and method
+decryptions = 64
+#size of the blinding pool of the pooled decryption
+pool_size = 16
+#keys attacked per method by the signal check, and their size
+attack_keys = 4
+attack_bits = 20
+#ciphertexts per set of the attack, the extra reduction of montgomery leaks less than the plain one
+attack_samples = 512
+#arithmetic the attack models for a method, plain if not listed
+attack_arith = {"naive, montgomery": "montgomery"}
+
+def methods(N, d, e):
+    """name -> dec(c) -> (x, h, reductions), the decryption modes compared."""
+    pool = rsa_blinded.BlindingPool(N, e, pool_size)
+    return {
+        "naive": lambda c: rsa_blinded.fast_pow(c, N, d),
+        "naive, montgomery": lambda c: rsa_blinded.fast_pow(c, N, d, arith="montgomery"),
+        "blinded": lambda c: rsa_blinded.dec(c, N, d, e),
+        "blinded, pooled": lambda c: rsa_blinded.dec(c, N, d, e, pool=pool),
+        "ladder": lambda c: rsa_blinded.fast_pow(c, N, d, "ladder"),
+        "ladder, blinded, pooled": lambda c: rsa_blinded.dec(c, N, d, e, "ladder", pool=pool),
+    }
+
+def decryptions_per_second(dec, cs):
+    start = time.perf_counter()
+    for c in cs:
+        dec(c)
+    return len(cs) / (time.perf_counter() - start)
+
+def attack_success(name, rng):
+    """Keys out of attack_keys the timing attack of ex1 recovers through the oracle of a method."""
+    import timing_attack
+    cracked = 0
+    for _ in range(attack_keys):
+        random.seed(rng.getrandbits(64))
+        N, e, d, p, q = timing_attack.key_gen(attack_bits)
+        dec = methods(N, d, e)[name]
+        def oracle(enc_x):
+            x, h, r = dec(enc_x)
+            return x, 0, r
+        result = timing_attack.AttackEngine(oracle, N, attack_samples, arith=attack_arith.get(name, "plain")).run()
+        cracked = cracked + (result.d == d)
+    return cracked
+
+if __name__ == "__main__":
+    print("%6s %26s %10s" % ("bits", "method", "decs/s"))
+    for bits in sizes:
+        # GenRSA draws primes of len(w) // 2 + 1 bits
+        N, e, d, p, q = rsa_blinded.GenRSA("1" * (bits - 2))
+        cs = [random.randrange(N) for _ in range(decryptions)]
+        for name, dec in methods(N, d, e).items():
+            assert all(dec(c)[0] == pow(c, d, N) for c in cs[:4])
+            print("%6d %26s %10.1f" % (bits, name, decryptions_per_second(dec, cs)))
+
+    # the cheapest method the attack gets nothing out of is the one to use
+    print()
+    print("%26s %10s" % ("method", "cracked"))
+    rng = random.Random(0)
+    for name in methods(3, 1, 1):
+        print("%26s %7d/%d" % (name, attack_success(name, rng), attack_keys))
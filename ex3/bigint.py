@@ -0,0 +1,41 @@
+try:
+    import gmpy2
+except ImportError:
+    # pure python ints, same results and reduction counts, only slower
+    gmpy2 = None
+
+# name of the big integer backend in use
+BACKEND = "gmpy2" if gmpy2 is not None else "python"
+
+def mpz(x):
+    """x in the backend's integer type, arithmetic on it is then done by GMP."""
+    return gmpy2.mpz(x) if gmpy2 is not None else x
+
+def powmod(x, e, m):
+    if gmpy2 is not None:
+        return int(gmpy2.powmod(x, e, m))
+    return pow(x, e, m)
+
+def invert(x, m):
+    """x^-1 mod m, ValueError if it doesn't exist."""
+    if gmpy2 is not None:
+        try:
+            return int(gmpy2.invert(x, m))
+        except ZeroDivisionError:
+            raise ValueError("%s has no inverse mod %s" % (x, m)) from None
+    return pow(x, -1, m)
+
+def is_prime(n, rounds=25):
+    if gmpy2 is not None:
+        return bool(gmpy2.is_prime(n, rounds))
+    import primegen
+    return primegen.is_prime(n)
+
+def next_prime(n):
+    """Smallest prime above n."""
+    if gmpy2 is not None:
+        return int(gmpy2.next_prime(n))
+    n = n + 1
+    while not is_prime(n):
+        n = n + 1
+    return n
@@ -0,0 +1,44 @@
+import rsa_blinded
+import random
+import numpy as np
+
+#modulus sizes to profile
+sizes = (1024, 2048)
+#decryptions traced per size
+decryptions = 32
+#size of the blinding pool of the pooled decryption
+pool_size = 16
+
+def profile(dec, trace):
+    """Where dec(c, trace) spends its time, phases in percent and the mean step times in ns."""
+    totals = {}
+    kinds, ns, reduced = [], [], []
+    for _ in range(decryptions):
+        trace.reset()
+        dec(trace)
+        for name, t in trace.phases.items():
+            totals[name] = totals.get(name, 0) + t
+        k, t, r = trace.steps()
+        kinds.extend(k)
+        ns.extend(t)
+        reduced.extend(r)
+    kinds, ns, reduced = np.array(kinds), np.array(ns), np.array(reduced, dtype=bool)
+    total = sum(totals.values())
+    for name, t in totals.items():
+        print("    %-16s %6.1f%%" % (name, 100 * t / total))
+    for kind, label in ((rsa_blinded.SQUARE, "square"), (rsa_blinded.MULTIPLY, "multiply")):
+        for r in (False, True):
+            sel = (kinds == kind) & (reduced == r)
+            if sel.any():
+                print("    %-8s %-12s %8.0f ns  (%d steps)" % (label, "reduced" if r else "not reduced", ns[sel].mean(), sel.sum()))
+
+if __name__ == "__main__":
+    for bits in sizes:
+        N, e, d, p, q = rsa_blinded.GenRSA("1" * (bits - 2))
+        # a step per bit of d for the squarings, and one per 1 bit for the multiplications
+        trace = rsa_blinded.StepTrace(2 * d.bit_length())
+        pool = rsa_blinded.BlindingPool(N, e, pool_size)
+        print("%d bits, fresh blinding factor" % bits)
+        profile(lambda t: rsa_blinded.dec(random.randrange(N), N, d, e, trace=t), trace)
+        print("%d bits, blinding pool" % bits)
+        profile(lambda t: rsa_blinded.dec(random.randrange(N), N, d, e, pool=pool, trace=t), trace)
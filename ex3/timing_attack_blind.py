@@ -1,9 +1,8 @@
 import rsa_blinded
 import time
 import sys
+import random
 from random import randrange
-import numpy as np
-import blessed
 
 #number of bits the modulus
 n_bits = 20
@@ -11,6 +10,12 @@ n_bits = 20
 num_samples = 32
 #maximum amount of backtracks
 max_bactracks = 10
+#number of worker processes measuring oracle queries, 1 measures in this process
+workers = 1
+#seed of the attack's randomness (and of the oracle's blinding factors), None for a different run every time
+seed = None
+#size of the oracle's precomputed blinding pool, 0 draws a fresh r for every decryption
+blinding_pool_size = 0
 
 # key gen function
 def key_gen(n_bits):
@@ -18,13 +23,14 @@ def key_gen(n_bits):
     return (N, e, d, p, q)
 
 # decryptioon oracle for Eve
-def decryption_oracle(enc_x, N, d, e):
-    start = time.time()
+def decryption_oracle(enc_x, N, d, e, pool_size=0):
+    start = time.perf_counter_ns()
 
     #decrypt the message
-    x, h, r = rsa_blinded.dec(enc_x, N, d, e)
-    res_time = time.time() - start
-    #eve eavesdrops the protocol, so she knows those
+    pool = rsa_blinded.blinding_pool(N, e, pool_size) if pool_size else None
+    x, h, r = rsa_blinded.dec(enc_x, N, d, e, pool=pool)
+    res_time = time.perf_counter_ns() - start
+    #eve eavesdrops the protocol, so she knows those, res_time in nanoseconds
     return x, res_time, r
 
 def gen_message_sets(N, d_i, n, e):
@@ -85,7 +91,14 @@ def check_key(alice, eve):
     return (eve["d"], False)
     
 if __name__== "__main__":
+    # the terminal UI, the statistics and the worker pool are only needed when the attack runs
+    import oracle_pool
+    import numpy as np
+    import blessed
+
     print("RSA modulus is %s bits long, Eve has %s samples" % (n_bits, num_samples))
+    if seed is not None:
+        random.seed(seed)
     #Alice is the party encrypting the message
     alice = {}
     #Eve is the attacker, she eavesdrops on the communcation protocol and know x, N, enc_x_s
@@ -123,6 +136,9 @@ if __name__== "__main__":
     print(term.gray("-") * alice["d"].bit_length())
     print(term.move_up(2) + term.move_right, end="")
 
+    # the key is shipped to every worker once, ciphertexts are sharded over them
+    measurer = oracle_pool.OraclePool(decryption_oracle, (alice["N"], alice["d"], alice["e"], blinding_pool_size), workers, random.getrandbits(64))
+
     last_bit = 1
     while True:
         # just printing stuff
@@ -151,14 +167,12 @@ if __name__== "__main__":
         extra_r_set = [[], []]
         no_extra_r_set = [[], []]
 
-        # ask decryption oracle to dec
-        for bit in (0, 1):
-            for c_text in no_extra_r_ciphers[bit]:
-                _, res_time, r = decryption_oracle(c_text, alice["N"], alice["d"], alice["e"])
-                no_extra_r_set[bit].append(r)
-            for c_text in extra_r_ciphers[bit]:
-                _, res_time, r = decryption_oracle(c_text, alice["N"], alice["d"], alice["e"])
-                extra_r_set[bit].append(r)
+        # ask decryption oracle to dec, all four sets are measured in one go
+        sets = no_extra_r_ciphers + extra_r_ciphers
+        r, res_time = measurer.measure([c_text for ciphers in sets for c_text in ciphers])
+        for i, ciphers in enumerate(sets):
+            measured, r = r[:len(ciphers)], r[len(ciphers):]
+            (no_extra_r_set if i < 2 else extra_r_set)[i % 2].extend(measured)
 
         # sets generated on premise that the next bit is equal to 0
         extra_r_0bit = np.array(extra_r_set[0])
@@ -206,6 +220,8 @@ if __name__== "__main__":
 
             break
 
+    measurer.close()
+
     # Key is cracked now, check the results
 
     if (eve["d"] != alice["d"]):